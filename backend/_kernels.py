@@ -0,0 +1,179 @@
+"""
+Compiled numeric kernels for the flood-risk hot paths.
+
+Kernels are compiled with Numba when it is installed; otherwise the same
+functions run as plain Python so the backend still works without it.
+"""
+
+import math
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:  # optional: fall back to interpreted kernels
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# Flat-earth projection around central Mumbai: over the ~40 km metro area the
+# error vs. great-circle distance is far below what the decay model resolves.
+COS_LAT0 = math.cos(math.radians(19.076))
+KM_PER_DEG = math.radians(6371.0)  # same Earth radius the haversine used
+KM_PER_DEG_LON = COS_LAT0 * KM_PER_DEG
+
+
+@njit(cache=True, fastmath=True)
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Equirectangular distance in km between two lat/lon points in Mumbai."""
+    dx = (lon2 - lon1) * KM_PER_DEG_LON
+    dy = (lat2 - lat1) * KM_PER_DEG
+    return math.sqrt(dx * dx + dy * dy)
+
+
+def rainfall_factor_exact(rainfall_24h_mm):
+    """Reference rainfall curve 0.1 + 0.9 × min(rain / 100mm, 1) ** 0.6 (scalar or array)."""
+    return 0.1 + 0.9 * np.minimum(np.maximum(np.divide(rainfall_24h_mm, 100.0), 0.0), 1.0) ** 0.6
+
+
+# The curve tabulated over 0-150 mm (~0.15 mm steps) and linearly interpolated:
+# no pow in the hot loops, max abs error 0.0035 (in the first cell, where x ** 0.6
+# is steepest) and under 2e-4 above 1 mm.
+RAIN_X = np.linspace(0.0, 150.0, 1025)
+RAIN_Y = rainfall_factor_exact(RAIN_X)
+_RAIN_INV_STEP = (RAIN_X.shape[0] - 1) / RAIN_X[-1]
+
+
+@njit(cache=True, fastmath=True)
+def rainfall_factor(rainfall_24h_mm: float) -> float:
+    """Scalar rainfall modulation factor (see flood_risk._rainfall_factor)."""
+    x = min(max(rainfall_24h_mm, 0.0), RAIN_X[-1]) * _RAIN_INV_STEP
+    i = min(int(x), RAIN_Y.shape[0] - 2)
+    return RAIN_Y[i] + (RAIN_Y[i + 1] - RAIN_Y[i]) * (x - i)
+
+
+@njit(cache=True, fastmath=True)
+def preference_at(
+    lat: float,
+    lon: float,
+    pivot_lat: np.ndarray,
+    pivot_lon: np.ndarray,
+    pivot_sev: np.ndarray,
+    spread_km: float,
+) -> float:
+    """Max of severity × exp(-d / spread) over pivots sorted by descending severity.
+
+    exp(-d / spread) <= 1, so once a pivot's severity drops below the best
+    contribution found so far no remaining pivot can beat it: exact early exit.
+    Likewise a pivot whose lat or lon offset alone exceeds
+    spread × ln(severity / best) is skipped before any sqrt/exp (|dx|, |dy| <= d).
+    """
+    rate = -1.0 / spread_km
+    best = 0.0
+    reach = 1e30  # finite: fastmath assumes no infinities
+    for j in range(pivot_lat.shape[0]):
+        if pivot_sev[j] <= best:
+            break
+        dx = abs(lon - pivot_lon[j]) * KM_PER_DEG_LON
+        dy = abs(lat - pivot_lat[j]) * KM_PER_DEG
+        if dx >= reach or dy >= reach:
+            continue
+        c = pivot_sev[j] * math.exp(math.sqrt(dx * dx + dy * dy) * rate)
+        if c > best:
+            best = c
+            # later pivots have severity <= pivot_sev[j]
+            reach = spread_km * math.log(pivot_sev[j] / best)
+    return min(best, 1.0)
+
+
+@njit(parallel=True, cache=True, fastmath=True)
+def preference_batch(
+    lats: np.ndarray,
+    lons: np.ndarray,
+    pivot_lat: np.ndarray,
+    pivot_lon: np.ndarray,
+    pivot_sev: np.ndarray,
+    spread_km: float,
+) -> np.ndarray:
+    """preference_at for many points, one thread-parallel pass without (n, m) temporaries."""
+    out = np.empty(lats.shape[0])
+    for i in prange(lats.shape[0]):
+        out[i] = preference_at(lats[i], lons[i], pivot_lat, pivot_lon, pivot_sev, spread_km)
+    return out
+
+
+@njit(parallel=True, cache=True, fastmath=True)
+def route_risk_kernel(
+    lat: np.ndarray,
+    lng: np.ndarray,
+    grid_lat: np.ndarray,
+    grid_lng: np.ndarray,
+    grid_rain: np.ndarray,
+    pivot_lat: np.ndarray,
+    pivot_lng: np.ndarray,
+    pivot_sev: np.ndarray,
+    spread_km: float,
+) -> float:
+    """Mean of preference × rainfall factor along a route, in a single pass.
+
+    Each point takes the rainfall of its nearest grid point; pivots must be
+    sorted by descending severity (see preference_at).
+    """
+    n = lat.shape[0]
+    if n == 0:
+        return 0.0
+    risk = np.empty(n)
+    for i in prange(n):
+        best_dist = 1e30  # finite: fastmath assumes no infinities
+        rain = 0.0
+        for k in range(grid_lat.shape[0]):
+            d = distance_km(lat[i], lng[i], grid_lat[k], grid_lng[k])
+            if d < best_dist:
+                best_dist = d
+                rain = grid_rain[k]
+        pref = preference_at(lat[i], lng[i], pivot_lat, pivot_lng, pivot_sev, spread_km)
+        risk[i] = pref * rainfall_factor(rain)
+    return risk.mean()
+
+
+@njit(cache=True)
+def decode_polyline(buf: np.ndarray, precision: int) -> np.ndarray:
+    """Decode an encoded polyline given as ASCII bytes into an (N, 2) lat/lng array.
+
+    Raises ValueError on truncated input (Numba does not bounds-check buf).
+    """
+    inv = 1.0 / (10.0 ** precision)
+    # every coordinate takes at least one byte per axis
+    out = np.empty((buf.shape[0] // 2 + 1, 2))
+    prev_lat = 0
+    prev_lng = 0
+    n = 0
+    i = 0
+    while i < buf.shape[0]:
+        for axis in range(2):
+            shift = 0
+            result = 0
+            while True:
+                if i >= buf.shape[0]:
+                    raise ValueError("truncated polyline")
+                byte_val = np.int64(buf[i]) - 63
+                i += 1
+                result |= (byte_val & 0x1F) << shift
+                shift += 5
+                if not (byte_val & 0x20):
+                    break
+            delta = ~(result >> 1) if result & 1 else result >> 1
+            if axis == 0:
+                prev_lat += delta
+            else:
+                prev_lng += delta
+        out[n, 0] = prev_lat * inv
+        out[n, 1] = prev_lng * inv
+        n += 1
+    return out[:n]
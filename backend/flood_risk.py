@@ -12,58 +12,196 @@ Layer 2: Real-Time Rainfall Modulation
   - Rain activates existing vulnerabilities
 """
 
-import csv
-import math
+import os
+import time
+from contextlib import suppress
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
 from typing import List, Tuple
 
-from .models import RouteSegment, HeatmapPoint
+import numpy as np
+
+from ._kernels import (
+    HAVE_NUMBA,
+    KM_PER_DEG,
+    KM_PER_DEG_LON,
+    RAIN_X,
+    RAIN_Y,
+    preference_at,
+    preference_batch,
+    route_risk_kernel,
+)
+from .models import HeatmapPoint, RoutePath
+
+# Optional, not in requirements.txt: only the NumPy fallback paths (no Numba)
+# build arrays large enough for NumExpr to help
+try:
+    import numexpr as ne
+    ne.set_num_threads(os.cpu_count() or 1)
+except ImportError:  # optional: plain NumPy is used instead
+    ne = None
+
+# Optional, not in requirements.txt: the spatial index only pays off with
+# more than _BAD_ROAD_BROADCAST_MAX bad roads (a bad_roads.csv well beyond
+# the fallback sample)
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # optional: bad-road lookups fall back to one broadcast
+    cKDTree = None
+
+# Below this many elements NumExpr's dispatch overhead outweighs its gains
+_NUMEXPR_MIN_SIZE = 4096
+
+
+def _decay(sev: np.ndarray, d: np.ndarray, sigma: float) -> np.ndarray:
+    """Exponential-decay kernel sev × exp(-d / σ), broadcasting sev over d."""
+    rate = d.dtype.type(-1.0 / sigma)  # multiply instead of divide; keeps d's precision
+    if ne is not None and d.size >= _NUMEXPR_MIN_SIZE:
+        return ne.evaluate("sev * exp(d * rate)")
+    return sev * np.exp(d * rate)
+
+
+PointTable = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _load_point_table(csv_path: Path, fallback: List[Tuple[float, float, float]]) -> PointTable:
+    """
+    Returns (lat, lon, severity) float64 arrays from a CSV of points.
+
+    The parsed arrays are cached in a sibling .npz stamped with the CSV's
+    mtime (ns) and size; it is reused only while both match exactly.
+    Missing severity column → 0.5; missing CSV → fallback.
+    """
+    if not csv_path.exists():
+        table = np.array(fallback, dtype=np.float64).reshape(-1, 3)
+        return table[:, 0].copy(), table[:, 1].copy(), table[:, 2].copy()
+
+    stat = csv_path.stat()
+    source = np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+    npz_path = csv_path.with_suffix(".npz")
+    try:
+        with np.load(npz_path) as data:
+            if np.array_equal(data["source"], source):
+                return data["lat"], data["lon"], data["sev"]
+    except Exception:
+        pass  # missing, outdated or unreadable cache: parse the CSV
+
+    with open(csv_path, encoding="utf-8") as f:
+        header = [c.strip() for c in f.readline().split(",")]
+    cols = [header.index("lat"), header.index("lon")]
+    if "severity" in header:
+        cols.append(header.index("severity"))
+    table = np.loadtxt(csv_path, delimiter=",", skiprows=1, usecols=cols, dtype=np.float64, ndmin=2)
+    lat, lon = table[:, 0].copy(), table[:, 1].copy()
+    sev = table[:, 2].copy() if table.shape[1] > 2 else np.full(lat.shape, 0.5)
+
+    # Write-then-rename so concurrent workers never load a half-written cache
+    tmp_path = npz_path.with_suffix(f".{os.getpid()}.tmp.npz")
+    try:
+        with open(tmp_path, "wb") as out:
+            np.savez(out, lat=lat, lon=lon, sev=sev, source=source)
+        os.replace(tmp_path, npz_path)
+    except OSError:
+        # read-only data dir (e.g. the :ro compose mount): parse the CSV again next start
+        with suppress(OSError):
+            tmp_path.unlink(missing_ok=True)
+    return lat, lon, sev
+
 
 # Optional static bad-road data (points with severity) - file: backend/data/bad_roads.csv
 BAD_ROADS_PATH = Path(__file__).resolve().parent / "data" / "bad_roads.csv"
 
 
-def _load_bad_roads() -> List[Tuple[float, float, float]]:
-    """Returns list of (lat, lon, severity) for known bad roads."""
-    items: List[Tuple[float, float, float]] = []
-    if not BAD_ROADS_PATH.exists():
-        # fallback sample bad roads
-        return [
-            (19.0757, 72.8772, 0.6),  # near CST
-            (19.0600, 72.8850, 0.7),
-            (19.0400, 72.8400, 0.5),
-        ]
-    with open(BAD_ROADS_PATH, encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            items.append((float(row["lat"]), float(row["lon"]), float(row.get("severity", 0.5))))
-    return items
+def _load_bad_roads() -> PointTable:
+    """Returns (lat, lon, severity) arrays for known bad roads."""
+    # fallback sample bad roads
+    return _load_point_table(BAD_ROADS_PATH, [
+        (19.0757, 72.8772, 0.6),  # near CST
+        (19.0600, 72.8850, 0.7),
+        (19.0400, 72.8400, 0.5),
+    ])
+
 
+# Bad-road points as flat NumPy arrays (degrees) for vectorized distance checks
+_BAD_LAT, _BAD_LON, _BAD_SEV = _load_bad_roads()
 
-_BAD_ROADS = _load_bad_roads()
+# Bad-road influence decays over 1 km; beyond 5 km it is under 1% of severity
+BAD_ROAD_DECAY_KM = 1.0
+_BAD_ROAD_CUTOFF_KM = 5.0 * BAD_ROAD_DECAY_KM
 
 
-def _road_condition_at_point(lat: float, lon: float) -> float:
-    """Return a penalty in [0,1] for bad road conditions near the point.
+# Projection origin near the metro centre: offsets stay within ~50 km, where
+# even float32 resolves millimetres
+_ORIGIN_LAT, _ORIGIN_LON = 19.076, 72.877
+
+
+def _offsets_km(lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+    """Flat-earth (x, y) km offsets from the origin.
+
+    The one projection used here: Euclidean distance between offsets equals
+    _kernels.distance_km.
+    """
+    return np.subtract(lons, _ORIGIN_LON) * KM_PER_DEG_LON, np.subtract(lats, _ORIGIN_LAT) * KM_PER_DEG
+
 
-    Uses nearest bad-road point with exponential decay by distance (km).
+def _distance_matrix_km(
+    lats: np.ndarray,
+    lons: np.ndarray,
+    to_x: np.ndarray,
+    to_y: np.ndarray,
+) -> np.ndarray:
+    """Pairwise distances in km, shape (len(lats), len(to_x)), to targets given as
+    _offsets_km in the targets' dtype (float32 for pivots).
     """
-    best = 0.0
-    for b_lat, b_lon, severity in _BAD_ROADS:
-        d = _haversine_km(lat, lon, b_lat, b_lon)
-        influence = math.exp(-d / 1.0)  # 1 km decay
-        best = max(best, severity * influence)
-    return min(best, 1.0)
+    x, y = _offsets_km(lats, lons)
+    dx = to_x[None, :] - x.astype(to_x.dtype)[:, None]
+    dy = to_y[None, :] - y.astype(to_y.dtype)[:, None]
+    return np.sqrt(dx * dx + dy * dy)
 
 
-def compute_bad_road_penalty_along_route(coordinates: List[RouteSegment]) -> float:
+# Bad roads as km offsets. With few of them one (points, bad roads) broadcast
+# is cheaper than walking the spatial index, which otherwise limits lookups
+# to bad roads within the cutoff radius.
+_BAD_X, _BAD_Y = _offsets_km(_BAD_LAT, _BAD_LON)
+_BAD_TREE = cKDTree(np.column_stack([_BAD_X, _BAD_Y])) if cKDTree is not None and _BAD_SEV.size else None
+_BAD_ROAD_BROADCAST_MAX = 256
+
+
+def _road_condition_points(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Return penalties in [0,1] for bad road conditions near each point.
+
+    Uses the strongest nearby bad-road point with exponential decay by distance (km).
+    """
+    out = np.zeros(len(lats))
+    if _BAD_SEV.size == 0 or not len(lats):
+        return out
+    if _BAD_TREE is None or _BAD_SEV.size <= _BAD_ROAD_BROADCAST_MAX:
+        d = _distance_matrix_km(lats, lons, _BAD_X, _BAD_Y)
+        return np.minimum(_decay(_BAD_SEV[None, :], d, BAD_ROAD_DECAY_KM).max(axis=1), 1.0)
+
+    # One tree query for the whole route, then flat (point, bad road) pairs
+    x, y = _offsets_km(lats, lons)
+    neighbours = _BAD_TREE.query_ball_point(np.column_stack([x, y]), r=_BAD_ROAD_CUTOFF_KM)
+    counts = np.fromiter(map(len, neighbours), dtype=np.intp, count=len(neighbours))
+    if not counts.any():
+        return out
+    rows = np.repeat(np.arange(len(lats)), counts)
+    cols = np.fromiter(chain.from_iterable(neighbours), dtype=np.intp, count=int(counts.sum()))
+    dx = _BAD_X[cols] - x[rows]
+    dy = _BAD_Y[cols] - y[rows]
+    contrib = _decay(_BAD_SEV[cols], np.sqrt(dx * dx + dy * dy), BAD_ROAD_DECAY_KM)
+    # pairs are grouped by point, so each non-empty group reduces in place
+    hit = counts > 0
+    out[hit] = np.maximum.reduceat(contrib, (np.cumsum(counts) - counts)[hit])
+    return np.minimum(out, 1.0)
+
+
+def compute_bad_road_penalty_along_route(path: RoutePath) -> float:
     """Compute average bad-road penalty along a route (0..1)."""
-    if not coordinates:
+    if not len(path):
         return 0.0
-    total = 0.0
-    for c in coordinates:
-        total += _road_condition_at_point(c.lat, c.lng)
-    return total / len(coordinates)
+    return float(_road_condition_points(path.lat, path.lng).mean())
 
 
 # Load true flood pivots from CSV (anchor points)
@@ -72,38 +210,138 @@ PIVOTS_PATH = Path(__file__).resolve().parent / "data" / "flood_pivots.csv"
 # Spread factor: higher = faster decay (risk spreads less far)
 SPREAD_FACTOR_KM = 2.0
 
-def _load_pivots() -> List[Tuple[float, float, float]]:
-    """Returns list of (lat, lon, severity)."""
-    pivots: List[Tuple[float, float, float]] = []
-    if not PIVOTS_PATH.exists():
-        # Fallback if CSV missing
-        return [
-            (19.0056, 72.8417, 0.95),   # Hindmata
-            (19.1197, 72.8464, 0.90),  # Andheri Subway
-            (19.0286, 72.8553, 0.88),  # Kings Circle
-            (19.0728, 72.8826, 0.85),  # Kurla
-        ]
-    with open(PIVOTS_PATH, encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            pivots.append((
-                float(row["lat"]),
-                float(row["lon"]),
-                float(row["severity"]),
-            ))
-    return pivots
-
-_FLOOD_PIVOTS = _load_pivots()
-
-
-def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Compute distance in km between two lat/lon points."""
-    R = 6371.0
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+@lru_cache(maxsize=None)
+def _load_pivots() -> PointTable:
+    """Returns (lat, lon, severity) arrays, read-only since they are shared.
+
+    Parsed once per process; _load_preference_map clears the cache when the
+    CSV changes.
+    """
+    # Fallback if CSV missing
+    table = _load_point_table(PIVOTS_PATH, [
+        (19.0056, 72.8417, 0.95),   # Hindmata
+        (19.1197, 72.8464, 0.90),  # Andheri Subway
+        (19.0286, 72.8553, 0.88),  # Kings Circle
+        (19.0728, 72.8826, 0.85),  # Kurla
+    ])
+    for a in table:
+        a.setflags(write=False)
+    return table
+
+
+# Above this many point-pivot pairs the compiled kernel beats the NumPy broadcast
+_PREF_KERNEL_MIN_PAIRS = 1 << 10
+
+
+def _preference_map_batch(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Exact preference map for points of any shape (see _preference_map_at_point)."""
+    shape = np.shape(lats)
+    if _PIVOT_SEV.size == 0:
+        return np.zeros(shape)
+    lats = np.ravel(lats)
+    lons = np.ravel(lons)
+    if HAVE_NUMBA and lats.size * _PIVOT_SEV.size >= _PREF_KERNEL_MIN_PAIRS:
+        pref = preference_batch(lats, lons, _PIVOT_LAT, _PIVOT_LON, _PIVOT_SEV, SPREAD_FACTOR_KM)
+    else:
+        d = _distance_matrix_km(lats, lons, _PIVOT_X, _PIVOT_Y)
+        pref = np.minimum(_decay(_PIVOT_SEV[None, :], d, SPREAD_FACTOR_KM).max(axis=1), 1.0)
+    return pref.reshape(shape)
+
+
+# Heatmap grid over the Mumbai bounding box: ~0.015° step ~1.6km apart
+# (rounded to 5 decimals so the JSON output stays short)
+_HEATMAP_LAT, _HEATMAP_LON = (
+    np.round(a.ravel(), 5)
+    for a in np.meshgrid(18.90 + np.arange(35) * 0.015, 72.75 + np.arange(35) * 0.015, indexing="ij")
+)
+
+# Without Numba the exact lookup is an interpreted NumPy broadcast, so the
+# (time-invariant) preference map is cached over the metro bbox in ~110 m
+# cells and served by bilinear interpolation. The cells clip the exp-decay
+# peak at each pivot: up to 0.033 low at pivots (mean 0.012) and up to 0.024
+# low elsewhere. With Numba the exact kernel (~1 µs) beats the grid read and
+# no grid is built.
+_PREF_LAT0, _PREF_LAT1 = 18.85, 19.35
+_PREF_LON0, _PREF_LON1 = 72.70, 73.15
+_PREF_STEP = 0.001
+_PREF_SHAPE = (
+    round((_PREF_LAT1 - _PREF_LAT0) / _PREF_STEP) + 1,
+    round((_PREF_LON1 - _PREF_LON0) / _PREF_STEP) + 1,
+)
+# How often (seconds) to check the pivot CSV for changes
+_PIVOTS_RECHECK_S = 60.0
+
+
+def _build_preference_grid() -> np.ndarray:
+    """Evaluate the exact preference map on every cache grid node (float32)."""
+    lats = np.linspace(_PREF_LAT0, _PREF_LAT1, _PREF_SHAPE[0])
+    lons = np.linspace(_PREF_LON0, _PREF_LON1, _PREF_SHAPE[1])
+    grid = np.empty(_PREF_SHAPE, dtype=np.float32)
+    rows = 64  # bounds the (cells, pivots) temporaries to a few MB
+    for r in range(0, _PREF_SHAPE[0], rows):
+        lat, lon = np.meshgrid(lats[r:r + rows], lons, indexing="ij")
+        grid[r:r + rows] = _preference_map_batch(lat.ravel(), lon.ravel()).reshape(lat.shape)
+    return grid
+
+
+def _pivots_mtime() -> float | None:
+    return PIVOTS_PATH.stat().st_mtime if PIVOTS_PATH.exists() else None
+
+
+def _load_preference_map() -> None:
+    """(Re)load pivots and rebuild every cache derived from them."""
+    global _FLOOD_PIVOTS, _PIVOT_LAT, _PIVOT_LON, _PIVOT_SEV, _PIVOT_X, _PIVOT_Y
+    global _PREF_GRID, _HEATMAP_PREF, _PIVOTS_MTIME, _PIVOTS_CHECKED_AT
+
+    _PIVOTS_MTIME = _pivots_mtime()
+    _PIVOTS_CHECKED_AT = time.monotonic()
+    _load_pivots.cache_clear()
+    lat, lon, sev = _load_pivots()
+    # Highest severity first, so per-point lookups can stop early
+    order = np.argsort(-sev, kind="stable")
+    # Pivots as flat NumPy arrays (degrees) so the preference map is one vectorized pass.
+    # Severity is float32 like the broadcast offsets below; degrees stay float64
+    # since float32 would move pivots by up to ~0.5 m at this longitude.
+    _FLOOD_PIVOTS = (lat[order], lon[order], sev[order].astype(np.float32))
+    _PIVOT_LAT, _PIVOT_LON, _PIVOT_SEV = _FLOOD_PIVOTS
+    # Projected once here instead of per pair in every broadcast; float32 halves
+    # the memory traffic of the (points, pivots) temporaries
+    _PIVOT_X, _PIVOT_Y = (a.astype(np.float32) for a in _offsets_km(lat[order], lon[order]))
+
+    _PREF_GRID = None if HAVE_NUMBA else _build_preference_grid()
+    _HEATMAP_PREF = _preference_map_batch(_HEATMAP_LAT, _HEATMAP_LON)
+    _preference_quantized.cache_clear()
+
+
+# Points off the dense grid are snapped to a 0.001° (~110 m) lattice and memoized
+_PREF_QUANTUM = 1000
+
+
+@lru_cache(maxsize=8192)
+def _preference_quantized(key_lat: int, key_lon: int) -> float:
+    return _preference_map_exact(key_lat / _PREF_QUANTUM, key_lon / _PREF_QUANTUM)
+
+
+def _refresh_preference_map() -> None:
+    """Rebuild the cached preference map if the pivot CSV changed (polled once a minute)."""
+    global _PIVOTS_CHECKED_AT
+    now = time.monotonic()
+    if now - _PIVOTS_CHECKED_AT < _PIVOTS_RECHECK_S:
+        return
+    _PIVOTS_CHECKED_AT = now
+    if _pivots_mtime() != _PIVOTS_MTIME:
+        _load_preference_map()
+
+
+_load_preference_map()
+
+
+def _preference_map_exact(lat: float, lon: float) -> float:
+    """Preference map evaluated directly against the pivots (severity-sorted, early exit)."""
+    if not HAVE_NUMBA:
+        # interpreted per-pivot loop is slow; one broadcast over all pivots instead
+        return float(_preference_map_batch(np.array([lat]), np.array([lon]))[0])
+    return float(preference_at(lat, lon, _PIVOT_LAT, _PIVOT_LON, _PIVOT_SEV, SPREAD_FACTOR_KM))
 
 
 def _preference_map_at_point(lat: float, lon: float) -> float:
@@ -118,17 +356,58 @@ def _preference_map_at_point(lat: float, lon: float) -> float:
     Where σ = SPREAD_FACTOR_KM (how fast risk decays with distance)
     
     Result: [0, 1] where 1 = maximum flood-prone, 0 = no inherent risk
+
+    Exact with Numba. Without it, points inside the metro bbox are read from
+    the precomputed grid with bilinear interpolation (see _PREF_GRID) and
+    others are memoized on a ~110 m lattice.
     """
-    preference = 0.0
-    
-    for p_lat, p_lon, severity in _FLOOD_PIVOTS:
-        distance_km = _haversine_km(lat, lon, p_lat, p_lon)
-        # Exponential decay: closer points have exponentially more influence
-        spatial_influence = math.exp(-distance_km / SPREAD_FACTOR_KM)
-        contribution = severity * spatial_influence
-        preference = max(preference, contribution)
-    
-    return min(preference, 1.0)
+    _refresh_preference_map()
+    if HAVE_NUMBA:
+        return _preference_map_exact(lat, lon)
+    if not (_PREF_LAT0 <= lat < _PREF_LAT1 and _PREF_LON0 <= lon < _PREF_LON1):
+        return _preference_quantized(round(lat * _PREF_QUANTUM), round(lon * _PREF_QUANTUM))
+
+    fi = (lat - _PREF_LAT0) / _PREF_STEP
+    fj = (lon - _PREF_LON0) / _PREF_STEP
+    i = min(int(fi), _PREF_SHAPE[0] - 2)
+    j = min(int(fj), _PREF_SHAPE[1] - 2)
+    ti, tj = fi - i, fj - j
+    g = _PREF_GRID
+    top = g[i, j] + (g[i, j + 1] - g[i, j]) * tj
+    bottom = g[i + 1, j] + (g[i + 1, j + 1] - g[i + 1, j]) * tj
+    return float(top + (bottom - top) * ti)
+
+
+def _preference_map_points(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    _preference_map_at_point for points of any shape (scalars included):
+    exact with Numba, else grid reads in the bbox.
+    """
+    _refresh_preference_map()
+    shape = np.shape(lats)
+    lats = np.ravel(np.asarray(lats, dtype=np.float64))
+    lons = np.ravel(np.asarray(lons, dtype=np.float64))
+    if HAVE_NUMBA:
+        return _preference_map_batch(lats, lons).astype(np.float64).reshape(shape)
+    inside = (_PREF_LAT0 <= lats) & (lats < _PREF_LAT1) & (_PREF_LON0 <= lons) & (lons < _PREF_LON1)
+
+    out = np.empty(lats.shape)
+    # same ~110 m lattice as the scalar path's _preference_quantized
+    out[~inside] = _preference_map_batch(
+        np.round(lats[~inside] * _PREF_QUANTUM) / _PREF_QUANTUM,
+        np.round(lons[~inside] * _PREF_QUANTUM) / _PREF_QUANTUM,
+    )
+
+    fi = (lats[inside] - _PREF_LAT0) / _PREF_STEP
+    fj = (lons[inside] - _PREF_LON0) / _PREF_STEP
+    i = np.minimum(fi.astype(np.intp), _PREF_SHAPE[0] - 2)
+    j = np.minimum(fj.astype(np.intp), _PREF_SHAPE[1] - 2)
+    ti, tj = fi - i, fj - j
+    g = _PREF_GRID
+    top = g[i, j] + (g[i, j + 1] - g[i, j]) * tj
+    bottom = g[i + 1, j] + (g[i + 1, j + 1] - g[i + 1, j]) * tj
+    out[inside] = top + (bottom - top) * ti
+    return out.reshape(shape)
 
 
 def _rainfall_factor(rainfall_24h_mm: float) -> float:
@@ -141,13 +420,15 @@ def _rainfall_factor(rainfall_24h_mm: float) -> float:
     - 100+ mm rain → factor = 1.0 (full risk activation)
     
     This is a sigmoid-like mapping: non-linear but smooth.
+    Reference curve: 0.1 + 0.9 × min(rain / 100mm, 1) ** 0.6, read from a
+    lookup table with linear interpolation (shared with the route kernels).
     """
-    if rainfall_24h_mm <= 0:
-        return 0.1  # base level, always some structural risk
-    # Normalized by 100mm as reference (heavy rain threshold)
-    normalized = min(rainfall_24h_mm / 100.0, 1.0)
-    # Smooth ramping: softer than linear, avoids false positives in dry weather
-    return 0.1 + 0.9 * (normalized ** 0.6)
+    return float(np.interp(rainfall_24h_mm, RAIN_X, RAIN_Y))
+
+
+def _rainfall_factor_vec(rainfall_24h_mm: np.ndarray) -> np.ndarray:
+    """Rainfall factor for an array of rainfall values (same table as the scalar)."""
+    return np.interp(rainfall_24h_mm, RAIN_X, RAIN_Y)
 
 
 def flood_risk_at_point(lat: float, lon: float, rainfall_24h_mm: float) -> float:
@@ -164,37 +445,45 @@ def flood_risk_at_point(lat: float, lon: float, rainfall_24h_mm: float) -> float
     return preference * rain_factor
 
 
+def flood_risk_at_points(lats: np.ndarray, lons: np.ndarray, rainfall_24h_mm) -> np.ndarray:
+    """
+    flood_risk_at_point for arrays of points in one vectorized pass.
+
+    lats and lons share any shape (scalars included); rainfall_24h_mm is a
+    scalar or an array broadcastable against them.
+    """
+    return _preference_map_points(lats, lons) * _rainfall_factor_vec(rainfall_24h_mm)
+
+
 def point_in_hotspot(lat: float, lng: float) -> float:
     """Preference map without rainfall modulation (structural vulnerability)."""
     return _preference_map_at_point(lat, lng)
 
 
 def compute_route_risk(
-    coordinates: List[RouteSegment],
-    rainfall_mm_along_route: List[float],
+    path: RoutePath,
+    rainfall_grid_points: List[Tuple[float, float, float]],
 ) -> float:
     """
     Average risk along entire route.
     
-    Samples the route at discrete points and computes mean final risk.
+    Samples the route at discrete points and computes mean final risk, each
+    point taking the rainfall of its nearest grid point (one fused kernel pass).
     """
-    if not coordinates or not rainfall_mm_along_route:
+    if len(path) == 0:
         return 0.0
 
-    n = min(len(coordinates), len(rainfall_mm_along_route))
-    total = 0.0
-    for i in range(n):
-        r = flood_risk_at_point(
-            coordinates[i].lat,
-            coordinates[i].lng,
-            rainfall_mm_along_route[i],
-        )
-        total += r
-    return total / float(n)
+    _refresh_preference_map()
+    grid = np.asarray(rainfall_grid_points, dtype=np.float64).reshape(-1, 3)
+    return float(route_risk_kernel(
+        path.lat, path.lng,
+        grid[:, 0], grid[:, 1], grid[:, 2],
+        _PIVOT_LAT, _PIVOT_LON, _PIVOT_SEV, SPREAD_FACTOR_KM,
+    ))
 
 
 def generate_heatmap_points(
-    routes_coordinates: List[List[RouteSegment]],
+    routes_coordinates: List[RoutePath],
     rainfall_grid_points: List[Tuple[float, float, float]],
 ) -> List[HeatmapPoint]:
     """
@@ -208,12 +497,11 @@ def generate_heatmap_points(
     if rainfall_grid_points:
         rainfall_24h = sum(p[2] for p in rainfall_grid_points) / max(len(rainfall_grid_points), 1)
 
-    heatmap: List[HeatmapPoint] = []
-    # Mumbai bounding box: ~0.015° step ~1.6km apart
-    for lat in [18.90 + i * 0.015 for i in range(35)]:
-        for lon in [72.75 + j * 0.015 for j in range(35)]:
-            risk = flood_risk_at_point(lat, lon, rainfall_24h)
-            if risk > 0.05:  # Only show meaningful risk
-                heatmap.append(HeatmapPoint(lat=lat, lng=lon, intensity=risk))
+    _refresh_preference_map()
+    risk = _HEATMAP_PREF * _rainfall_factor(rainfall_24h)
 
-    return heatmap
\ No newline at end of file
+    keep = np.flatnonzero(risk > 0.05)  # Only show meaningful risk
+    return [
+        HeatmapPoint(lat=float(_HEATMAP_LAT[k]), lng=float(_HEATMAP_LON[k]), intensity=float(risk[k]))
+        for k in keep
+    ]
\ No newline at end of file
@@ -1,9 +1,17 @@
-import math
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from typing import List, Tuple
 
 import httpx
+import numpy as np
+import orjson
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+
+from backend._kernels import HAVE_NUMBA, decode_polyline
 
 
 def _decode_polyline(polyline_str: str, precision: int = 5) -> List[Tuple[float, float]]:
@@ -39,11 +47,28 @@ def _decode_polyline(polyline_str: str, precision: int = 5) -> List[Tuple[float,
     
     return decoded
 
+
+def _decode_polyline_array(polyline_str: str, precision: int = 5) -> np.ndarray:
+    """
+    Decode a polyline string into an (N, 2) array of (lat, lng) rows.
+    Uses the compiled decoder when Numba is available.
+    Raises ValueError if the string is not a valid polyline.
+    """
+    if HAVE_NUMBA:
+        buf = np.frombuffer(polyline_str.encode("ascii"), dtype=np.uint8)
+        return decode_polyline(buf, precision)
+    try:
+        decoded = _decode_polyline(polyline_str, precision)
+    except IndexError:
+        raise ValueError("truncated polyline") from None
+    return np.array(decoded, dtype=np.float64).reshape(-1, 2)
+
 from backend.config import ORS_API_KEY, ORS_BASE_URL
 from backend.models import (
     RouteRequest,
     RoutesResponse,
     RouteResponseItem,
+    RoutePath,
     RouteSegment,
 )
 from backend.flood_risk import (
@@ -52,7 +77,27 @@ from backend.flood_risk import (
     compute_bad_road_penalty_along_route,
 )
 
-app = FastAPI(title="OptiRoute Backend", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP/2 client for ORS and Open-Meteo: connections (and TLS
+    # handshakes) are reused across requests and concurrent calls multiplex
+    app.state.http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=20.0,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+    )
+    try:
+        yield
+    finally:
+        await app.state.http_client.aclose()
+
+
+app = FastAPI(
+    title="OptiRoute Backend",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # CORS: allow frontend dev server on localhost:5173, adjust as needed
 app.add_middleware(
@@ -63,6 +108,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Route coordinates and heatmap points are highly repetitive JSON
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
+
+class _TTLCache:
+    """Small in-process cache whose entries expire after ttl_s seconds."""
+
+    def __init__(self, ttl_s: float, max_entries: int) -> None:
+        self._ttl_s = ttl_s
+        self._max_entries = max_entries
+        self._entries: dict = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        return value
+
+    def set(self, key, value) -> None:
+        if key not in self._entries and len(self._entries) >= self._max_entries:
+            # evict the oldest insertion
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = (time.monotonic() + self._ttl_s, value)
+
+
+# ORS geometry barely changes for the same endpoints (coordinates rounded to
+# 4 decimals, ~11 m); Open-Meteo only updates hourly
+_ROUTE_CACHE = _TTLCache(ttl_s=600.0, max_entries=1024)
+_RAINFALL_CACHE = _TTLCache(ttl_s=900.0, max_entries=1)
+
+
+def _http_client() -> httpx.AsyncClient:
+    """Shared client opened in the app lifespan."""
+    return app.state.http_client
+
 
 def _to_coordinates_list(ors_coords: List[List[float]]) -> List[RouteSegment]:
     # ORS returns [lng, lat]
@@ -91,46 +175,47 @@ async def geocode_destination(text: str) -> Tuple[float, float]:
         "boundary.circle.radius": 30_000,  # meters
     }
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(url, params=params)
-        if resp.status_code != 200:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Geocoding failed: {resp.text}",
-            )
-        data = resp.json()
-        features = data.get("features") or []
-        if not features:
-            raise HTTPException(status_code=404, detail="Destination not found in Mumbai")
-        coords = features[0]["geometry"]["coordinates"]  # [lon, lat]
-        dest_lat, dest_lng = coords[1], coords[0]
-        
-        # Stricter bounds: must be within Mumbai city area
-        # Mumbai city boundaries are approximately:
-        # North: 19.26°N, South: 18.96°N, East: 73.02°E, West: 72.80°E
-        mumbai_lat_min, mumbai_lat_max = 18.90, 19.30
-        mumbai_lng_min, mumbai_lng_max = 72.75, 73.10
-        
-        print(f"[GEOCODING] '{text}' (searched as '{search_text}') → lat={dest_lat:.4f}, lng={dest_lng:.4f}")
-        
-        if not (mumbai_lat_min <= dest_lat <= mumbai_lat_max and 
-                mumbai_lng_min <= dest_lng <= mumbai_lng_max):
-            raise HTTPException(
-                status_code=404,
-                detail=f"'{text}' geocoded to lat={dest_lat:.2f}, lng={dest_lng:.2f} which is outside Mumbai. Got: {features[0]}"
-            )
-        
-        return dest_lat, dest_lng
+    client = _http_client()
+    resp = await client.get(url, params=params, timeout=10.0)
+    if resp.status_code != 200:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Geocoding failed: {resp.text}",
+        )
+    data = orjson.loads(resp.content)
+    features = data.get("features") or []
+    if not features:
+        raise HTTPException(status_code=404, detail="Destination not found in Mumbai")
+    coords = features[0]["geometry"]["coordinates"]  # [lon, lat]
+    dest_lat, dest_lng = coords[1], coords[0]
+    
+    # Stricter bounds: must be within Mumbai city area
+    # Mumbai city boundaries are approximately:
+    # North: 19.26°N, South: 18.96°N, East: 73.02°E, West: 72.80°E
+    mumbai_lat_min, mumbai_lat_max = 18.90, 19.30
+    mumbai_lng_min, mumbai_lng_max = 72.75, 73.10
+    
+    print(f"[GEOCODING] '{text}' (searched as '{search_text}') → lat={dest_lat:.4f}, lng={dest_lng:.4f}")
+    
+    if not (mumbai_lat_min <= dest_lat <= mumbai_lat_max and 
+            mumbai_lng_min <= dest_lng <= mumbai_lng_max):
+        raise HTTPException(
+            status_code=404,
+            detail=f"'{text}' geocoded to lat={dest_lat:.2f}, lng={dest_lng:.2f} which is outside Mumbai. Got: {features[0]}"
+        )
+    
+    return dest_lat, dest_lng
 
 
 async def fetch_route(
     profile: str,
     origin: Tuple[float, float],
     destination: Tuple[float, float],
-    avoid_polygons_geojson: dict | None = None,
-) -> Tuple[List[RouteSegment], float, float]:
+    avoid_scale: float | None = None,
+) -> Tuple[RoutePath, float, float]:
     """
     Call ORS Directions API for a single route.
+    avoid_scale selects one of the precomputed _AVOID_POLYGONS (None: no avoidance).
     """
     if not ORS_API_KEY:
         raise HTTPException(status_code=500, detail="ORS_API_KEY not configured")
@@ -162,6 +247,19 @@ async def fetch_route(
     
     print(f"[ROUTING] Origin: {origin}, Destination: {destination}, Distance: {dist_degrees:.4f}°")
 
+    cache_key = (
+        profile,
+        round(origin[0], 4),
+        round(origin[1], 4),
+        round(destination[0], 4),
+        round(destination[1], 4),
+        avoid_scale,
+    )
+    cached = _ROUTE_CACHE.get(cache_key)
+    if cached is not None:
+        print(f"[ORS_CACHE] {profile}: {origin} → {destination}")
+        return cached
+
     url = f"{ORS_BASE_URL}/v2/directions/{profile}"
     body: dict = {
     "coordinates": [
@@ -172,86 +270,100 @@ async def fetch_route(
 }
 
 
-    if avoid_polygons_geojson:
+    if avoid_scale is not None:
         body.setdefault("options", {})
-        body["options"]["avoid_polygons"] = avoid_polygons_geojson
+        body["options"]["avoid_polygons"] = _AVOID_POLYGONS[avoid_scale]
 
     headers = {"Authorization": ORS_API_KEY, "Content-Type": "application/json"}
     
     print(f"[ORS_REQUEST] {profile}: {origin} → {destination}")
     print(f"[ORS_BODY] {body}")
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        resp = await client.post(url, json=body, headers=headers)
-        if resp.status_code != 200:
-            # Parse error response for better messaging
-            try:
-                error_data = resp.json()
-                error_msg = error_data.get("error", {})
-                if isinstance(error_msg, dict):
-                    error_detail = error_msg.get("message", str(error_msg))
-                else:
-                    error_detail = str(error_msg)
+    client = _http_client()
+    resp = await client.post(url, content=orjson.dumps(body), headers=headers)
+    if resp.status_code != 200:
+        # Parse error response for better messaging
+        try:
+            error_data = orjson.loads(resp.content)
+            error_msg = error_data.get("error", {})
+            if isinstance(error_msg, dict):
+                error_detail = error_msg.get("message", str(error_msg))
+            else:
+                error_detail = str(error_msg)
                     
-                if "routable point" in error_detail.lower():
-                    raise HTTPException(
-                        status_code=400,
-                        detail="Route endpoint is not accessible by road. Try a different destination."
-                    )
-                elif "exceed" in error_detail.lower() and "distance" in error_detail.lower():
-                    raise HTTPException(
-                        status_code=400,
-                        detail="Route is too long. Please choose destinations closer together in Mumbai."
-                    )
-            except HTTPException:
-                raise
-            except:
-                pass
-            raise HTTPException(
-                status_code=500, detail=f"Routing failed: {resp.text}"
-            )
-        data = resp.json()
+            if "routable point" in error_detail.lower():
+                raise HTTPException(
+                    status_code=400,
+                    detail="Route endpoint is not accessible by road. Try a different destination."
+                )
+            elif "exceed" in error_detail.lower() and "distance" in error_detail.lower():
+                raise HTTPException(
+                    status_code=400,
+                    detail="Route is too long. Please choose destinations closer together in Mumbai."
+                )
+        except HTTPException:
+            raise
+        except:
+            pass
+        raise HTTPException(
+            status_code=500, detail=f"Routing failed: {resp.text}"
+        )
+    data = orjson.loads(resp.content)
         
-        # Better error diagnostics
-        if "error" in data:
-            error_msg = data.get("error", {})
-            if isinstance(error_msg, dict):
-                error_msg = error_msg.get("message", str(error_msg))
-            raise HTTPException(
-                status_code=400, detail=f"ORS API error: {error_msg}"
-            )
+    # Better error diagnostics
+    if "error" in data:
+        error_msg = data.get("error", {})
+        if isinstance(error_msg, dict):
+            error_msg = error_msg.get("message", str(error_msg))
+        raise HTTPException(
+            status_code=400, detail=f"ORS API error: {error_msg}"
+        )
         
-        routes = data.get("routes") or []
-        if not routes:
-            raise HTTPException(
-                status_code=400,
-                detail="No route found from ORS API"
-            )
-
-        route = routes[0]
-        summary = route["summary"]
-        distance_m = summary["distance"]
-        duration_s = summary["duration"]
-
-        # Decode polyline geometry
-        geometry_str = route.get("geometry", "")
-        if not geometry_str:
-            raise HTTPException(
-                status_code=500,
-                detail="Route has no geometry data"
-            )
+    routes = data.get("routes") or []
+    if not routes:
+        raise HTTPException(
+            status_code=400,
+            detail="No route found from ORS API"
+        )
+
+    route = routes[0]
+    summary = route["summary"]
+    distance_m = summary["distance"]
+    duration_s = summary["duration"]
+
+    # Decode polyline geometry
+    geometry_str = route.get("geometry", "")
+    if not geometry_str:
+        raise HTTPException(
+            status_code=500,
+            detail="Route has no geometry data"
+        )
         
-        # geometry is encoded polyline: decode it to (lat, lng) tuples
-        decoded_coords = _decode_polyline(geometry_str)
-        segments = [RouteSegment(lat=lat, lng=lng) for lat, lng in decoded_coords]
+    # geometry is encoded polyline: decode it to (lat, lng) rows
+    try:
+        path = RoutePath.from_latlng(_decode_polyline_array(geometry_str))
+    except ValueError:
+        raise HTTPException(
+            status_code=500,
+            detail="Route geometry could not be decoded"
+        )
+    # cached paths are shared between requests
+    path.lat.flags.writeable = False
+    path.lng.flags.writeable = False
 
-        return segments, distance_m, duration_s
+    result = (path, distance_m, duration_s)
+    _ROUTE_CACHE.set(cache_key, result)
+    return result
 
 
 async def fetch_rainfall_mm_near_mumbai() -> List[Tuple[float, float, float]]:
     """
     Open-Meteo: free, no API key. Returns rainfall grid for Mumbai.
     """
+    cached = _RAINFALL_CACHE.get("mumbai")
+    if cached is not None:
+        return cached
+
     center_lat, center_lng = 19.0760, 72.8777
 
     url = "https://api.open-meteo.com/v1/forecast"
@@ -263,14 +375,14 @@ async def fetch_rainfall_mm_near_mumbai() -> List[Tuple[float, float, float]]:
         "forecast_hours": 0,
     }
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(url, params=params)
-        if resp.status_code != 200:
-            return []
+    client = _http_client()
+    resp = await client.get(url, params=params, timeout=10.0)
+    if resp.status_code != 200:
+        return []
 
-        data = resp.json()
-        hourly = data.get("hourly") or {}
-        precip = hourly.get("precipitation") or []
+    data = orjson.loads(resp.content)
+    hourly = data.get("hourly") or {}
+    precip = hourly.get("precipitation") or []
 
     total_rain = sum(float(p or 0) for p in precip[:24])
 
@@ -282,13 +394,15 @@ async def fetch_rainfall_mm_near_mumbai() -> List[Tuple[float, float, float]]:
         (-0.03, 0.03),
         (-0.03, -0.03),
     ]
-    return [
+    grid = [
         (center_lat + dlat, center_lng + dlng, total_rain)
         for dlat, dlng in offsets
     ]
+    _RAINFALL_CACHE.set("mumbai", grid)
+    return grid
 
 
-def _sample_route_for_rain(coordinates: List[RouteSegment], max_points: int = 100) -> List[RouteSegment]:
+def _sample_route_for_rain(coordinates: RoutePath, max_points: int = 100) -> RoutePath:
     """
     Smart down-sampling of route coordinates for risk/rainfall computation.
     Ensures we have enough points to accurately assess flood risk along the route.
@@ -299,40 +413,6 @@ def _sample_route_for_rain(coordinates: List[RouteSegment], max_points: int = 10
     return coordinates[::step]
 
 
-def _assign_rain_to_route(
-    sampled_coords: List[RouteSegment],
-    rainfall_grid: List[Tuple[float, float, float]],
-) -> List[float]:
-    """
-    Assign rainfall to each point along the route.
-    Uses nearest-neighbor in the rainfall grid for simplicity.
-    """
-    if not rainfall_grid:
-        return [0.0 for _ in sampled_coords]
-
-    def haversine(lat1, lon1, lat2, lon2) -> float:
-        R = 6371000.0
-        phi1, phi2 = math.radians(lat1), math.radians(lat2)
-        dphi = math.radians(lat2 - lat1)
-        dlambda = math.radians(lon2 - lon1)
-        a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(
-            dlambda / 2
-        ) ** 2
-        return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    rains: List[float] = []
-    for coord in sampled_coords:
-        best_rain = 0.0
-        best_dist = float("inf")
-        for lat, lng, rain_mm in rainfall_grid:
-            d = haversine(coord.lat, coord.lng, lat, lng)
-            if d < best_dist:
-                best_dist = d
-                best_rain = rain_mm
-        rains.append(best_rain)
-    return rains
-
-
 def _make_avoid_polygon_smart(scale: float) -> dict:
     """
     Create an avoidance polygon centered on high-risk waterlogging areas.
@@ -364,6 +444,10 @@ def _make_avoid_polygon_smart(scale: float) -> dict:
     }
 
 
+# get_routes only ever asks for these two scales; build the polygons once
+_AVOID_POLYGONS = {scale: _make_avoid_polygon_smart(scale) for scale in (0.5, 1.0)}
+
+
 @app.post("/api/routes", response_model=RoutesResponse)
 async def get_routes(payload: RouteRequest) -> RoutesResponse:
     """
@@ -406,68 +490,64 @@ async def get_routes(payload: RouteRequest) -> RoutesResponse:
     
     print(f"[API_REQUEST] Origin: {origin}, Destination text: {payload.destination_text}, Dest coords: {dest}")
 
-    # Fetch rainfall grid once (applies to all routes equally)
-    rainfall_grid = await fetch_rainfall_mm_near_mumbai()
-
-    # Generate routes using different strategies
+    # Generate routes using different strategies, fetched concurrently together
+    # with the rainfall grid (applies to all routes equally)
     # =========================================
-
     # Route 1: Fastest (baseline, no avoidance)
-    fastest_coords, fastest_dist, fastest_dur = await fetch_route(
-        profile="driving-car",
-        origin=origin,
-        destination=dest,
-    )
-
     # Routes 2 & 3: Safer/Safest by progressively increasing avoidance
     # These routes actively avoid known flood-prone areas from the preference map
-    safer_coords, safer_dist, safer_dur = await fetch_route(
-        profile="driving-car",
-        origin=origin,
-        destination=dest,
-        avoid_polygons_geojson=_make_avoid_polygon_smart(scale=0.5),
-    )
-
-    safest_coords, safest_dist, safest_dur = await fetch_route(
-        profile="driving-car",
-        origin=origin,
-        destination=dest,
-        avoid_polygons_geojson=_make_avoid_polygon_smart(scale=1.0),
+    (
+        rainfall_grid,
+        (fastest_coords, fastest_dist, fastest_dur),
+        (safer_coords, safer_dist, safer_dur),
+        (safest_coords, safest_dist, safest_dur),
+    ) = await asyncio.gather(
+        fetch_rainfall_mm_near_mumbai(),
+        fetch_route(
+            profile="driving-car",
+            origin=origin,
+            destination=dest,
+        ),
+        fetch_route(
+            profile="driving-car",
+            origin=origin,
+            destination=dest,
+            avoid_scale=0.5,
+        ),
+        fetch_route(
+            profile="driving-car",
+            origin=origin,
+            destination=dest,
+            avoid_scale=1.0,
+        ),
     )
 
     # Compute risk scores and bad-road penalties using the two-layer system
     # ====================================================================
     all_routes_coords = [fastest_coords, safer_coords, safest_coords]
-    sampled_routes: List[List[RouteSegment]] = []
-    rain_alongs: List[List[float]] = []
     risk_scores: List[float] = []
     bad_penalties: List[float] = []
 
     for coords in all_routes_coords:
         sampled = _sample_route_for_rain(coords)
-        rain_along = _assign_rain_to_route(sampled, rainfall_grid)
-        risk = compute_route_risk(sampled, rain_along)
+        risk = compute_route_risk(sampled, rainfall_grid)
         bad = compute_bad_road_penalty_along_route(sampled)
 
-        sampled_routes.append(sampled)
-        rain_alongs.append(rain_along)
         risk_scores.append(risk)
         bad_penalties.append(bad)
 
     fastest_risk, safer_risk, safest_risk = risk_scores
-    fastest_bad, safer_bad, safest_bad = bad_penalties
 
     # Combine into a single score for ranking/explanation
-    dists = [fastest_dist, safer_dist, safest_dist]
-    min_d, max_d = min(dists), max(dists)
-    dist_range = max(max_d - min_d, 1.0)
-
-    combined_scores: List[float] = []
-    for idx, (r, b, dist) in enumerate(zip(risk_scores, bad_penalties, dists)):
-        dist_norm = (dist - min_d) / dist_range
-        # weights: risk 60%, bad-road 30%, distance 10%
-        score = 0.6 * r + 0.3 * b + 0.1 * dist_norm
-        combined_scores.append(score)
+    risks = np.array(risk_scores)
+    bads = np.array(bad_penalties)
+    dists = np.array([fastest_dist, safer_dist, safest_dist])
+    min_d = dists.min()
+    dist_norm = (dists - min_d) / max(np.ptp(dists), 1.0)
+    # weights: risk 60%, bad-road 30%, distance 10%
+    combined_scores = (0.6 * risks + 0.3 * bads + 0.1 * dist_norm).tolist()
+    # distance relative to the shortest route, in percent
+    rel_pcts = ((dists - min_d) / max(min_d, 1.0) * 100.0).tolist()
 
     # Build response: three meaningful route options
     routes = [
@@ -480,7 +560,7 @@ async def get_routes(payload: RouteRequest) -> RoutesResponse:
             risk_score=fastest_risk,
             score=combined_scores[0],
             explanation="",
-            coordinates=fastest_coords,
+            coordinates=fastest_coords.to_segments(),
         ),
         RouteResponseItem(
             id="safer",
@@ -491,7 +571,7 @@ async def get_routes(payload: RouteRequest) -> RoutesResponse:
             risk_score=safer_risk,
             score=combined_scores[1],
             explanation="",
-            coordinates=safer_coords,
+            coordinates=safer_coords.to_segments(),
         ),
         RouteResponseItem(
             id="safest",
@@ -502,7 +582,7 @@ async def get_routes(payload: RouteRequest) -> RoutesResponse:
             risk_score=safest_risk,
             score=combined_scores[2],
             explanation="",
-            coordinates=safest_coords,
+            coordinates=safest_coords.to_segments(),
         ),
     ]
 
@@ -510,23 +590,21 @@ async def get_routes(payload: RouteRequest) -> RoutesResponse:
     heatmap_points = generate_heatmap_points(all_routes_coords, rainfall_grid)
 
     # Build explanations comparing to fastest route
-    fastest_idx = 0
-    min_dist = min(fastest_dist, safer_dist, safest_dist)
     for idx, item in enumerate(routes):
         parts: List[str] = []
         # distance comparison
-        rel_pct = ((item.distance_m - min_dist) / max(min_dist, 1.0)) * 100.0
+        rel_pct = rel_pcts[idx]
         if rel_pct <= 1.0:
             parts.append("Shortest distance")
         else:
             parts.append(f"{rel_pct:.0f}% longer than shortest route")
 
         # risk explanation
-        r = [fastest_risk, safer_risk, safest_risk][idx]
+        r = risk_scores[idx]
         parts.append(f"Flood risk: {(r * 100):.0f}%")
 
         # bad road note
-        b = [fastest_bad, safer_bad, safest_bad][idx]
+        b = bad_penalties[idx]
         if b > 0.4:
             parts.append("Passes near known poor road conditions — expect delays or rough patches")
         elif b > 0.1:
@@ -1,4 +1,7 @@
+from dataclasses import dataclass
 from typing import List, Literal, Optional
+
+import numpy as np
 from pydantic import BaseModel, Field
 
 
@@ -24,6 +27,34 @@ class RouteSegment(BaseModel):
     lng: float
 
 
+@dataclass
+class RoutePath:
+    """Route geometry as parallel lat/lng arrays, used internally by the risk kernels."""
+    lat: np.ndarray
+    lng: np.ndarray
+
+    @classmethod
+    def from_latlng(cls, latlng: np.ndarray) -> "RoutePath":
+        """Build from an (N, 2) array of (lat, lng) rows."""
+        return cls(lat=np.ascontiguousarray(latlng[:, 0]), lng=np.ascontiguousarray(latlng[:, 1]))
+
+    def __len__(self) -> int:
+        return self.lat.shape[0]
+
+    def __getitem__(self, key: slice) -> "RoutePath":
+        return RoutePath(lat=self.lat[key], lng=self.lng[key])
+
+    def to_segments(self) -> List[RouteSegment]:
+        """Materialize response models (once, for JSON output).
+
+        Rounded to 5 decimals (~1 m, the ORS polyline precision) so the JSON
+        floats stay short.
+        """
+        lats = np.round(self.lat, 5).tolist()
+        lngs = np.round(self.lng, 5).tolist()
+        return [RouteSegment(lat=lat, lng=lng) for lat, lng in zip(lats, lngs)]
+
+
 class RouteResponseItem(BaseModel):
     id: Literal["fastest", "safer", "safest"]
     label: str
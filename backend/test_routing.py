@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for the routing helpers in main.py (polyline decoding, TTL caches).
+Run from the repo root: pytest backend/test_routing.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add repo root to path so the backend package resolves
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend._kernels import decode_polyline
+from backend.main import _TTLCache, _decode_polyline, _decode_polyline_array
+
+# Reference example from Google's polyline algorithm documentation
+_GOOGLE_EXAMPLE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+_GOOGLE_POINTS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+
+def _encode_polyline(points, precision: int = 5) -> str:
+    """Encode (lat, lng) points with Google's polyline algorithm."""
+    factor = 10 ** precision
+    out = []
+    prev = [0, 0]
+    for point in points:
+        for axis in range(2):
+            value = round(point[axis] * factor)
+            delta = value - prev[axis]
+            prev[axis] = value
+            delta = ~(delta << 1) if delta < 0 else delta << 1
+            while delta >= 0x20:
+                out.append(chr((0x20 | (delta & 0x1F)) + 63))
+                delta >>= 5
+            out.append(chr(delta + 63))
+    return "".join(out)
+
+
+def _decode_compiled(polyline_str: str, precision: int = 5) -> np.ndarray:
+    return decode_polyline(np.frombuffer(polyline_str.encode("ascii"), dtype=np.uint8), precision)
+
+
+def test_decode_google_example():
+    """Both decoders reproduce the documented example."""
+    np.testing.assert_allclose(_decode_polyline(_GOOGLE_EXAMPLE), _GOOGLE_POINTS)
+    np.testing.assert_allclose(_decode_compiled(_GOOGLE_EXAMPLE), _GOOGLE_POINTS)
+
+
+@pytest.mark.parametrize("precision", [5, 6])
+def test_decode_matches_python(precision):
+    """Compiled decoder agrees with the pure-Python one on a random Mumbai route."""
+    rng = np.random.default_rng(precision)
+    points = np.column_stack([
+        19.07 + np.cumsum(rng.normal(0, 0.002, 500)),
+        72.88 + np.cumsum(rng.normal(0, 0.002, 500)),
+    ])
+    encoded = _encode_polyline(points, precision)
+    expected = np.array(_decode_polyline(encoded, precision))
+    np.testing.assert_array_equal(_decode_compiled(encoded, precision), expected)
+    np.testing.assert_array_equal(_decode_polyline_array(encoded, precision), expected)
+
+
+def test_decode_empty():
+    assert _decode_compiled("").shape == (0, 2)
+    assert _decode_polyline_array("").shape == (0, 2)
+
+
+@pytest.mark.parametrize("truncated", [
+    _GOOGLE_EXAMPLE[:-1],  # last value cut mid-chunk
+    "_p~iF~ps|U_",  # dangling continuation byte
+    "_p~iF",  # latitude without its longitude
+])
+def test_decode_truncated(truncated):
+    """Truncated input is rejected instead of decoding past the buffer."""
+    with pytest.raises(IndexError):
+        _decode_polyline(truncated)
+    with pytest.raises(ValueError):
+        _decode_compiled(truncated)
+    with pytest.raises(ValueError):
+        _decode_polyline_array(truncated)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic for cache expiry tests."""
+    now = [1000.0]
+    monkeypatch.setattr("backend.main.time.monotonic", lambda: now[0])
+    return now
+
+
+def test_ttl_cache_expiry(clock):
+    cache = _TTLCache(ttl_s=10.0, max_entries=4)
+    cache.set("a", 1)
+    clock[0] += 9.0
+    assert cache.get("a") == 1
+    clock[0] += 2.0
+    assert cache.get("a") is None
+    assert cache.get("missing") is None
+
+
+def test_ttl_cache_eviction(clock):
+    cache = _TTLCache(ttl_s=10.0, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("a", 10)  # overwriting an existing key does not evict
+    assert (cache.get("a"), cache.get("b")) == (10, 2)
+    cache.set("c", 3)  # full: the oldest insertion ("a") goes
+    assert cache.get("a") is None
+    assert (cache.get("b"), cache.get("c")) == (2, 3)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -1,56 +1,155 @@
 #!/usr/bin/env python3
 """
-Quick validation script for OptiRoute two-layer system.
-Run from backend/: python validate_system.py
+Quick validation tests for OptiRoute two-layer system.
+Run from the repo root: pytest backend/validate_system.py
+(or python backend/validate_system.py)
 """
 
+import errno
+import os
 import sys
 from pathlib import Path
 
-# Add backend to path
-sys.path.insert(0, str(Path(__file__).parent))
+import numpy as np
+import pytest
 
-from flood_risk import (
+# Add repo root to path so the backend package resolves
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend import flood_risk
+from backend._kernels import COS_LAT0, KM_PER_DEG
+from backend.flood_risk import (
     _load_pivots,
-    _preference_map_at_point,
+    _load_point_table,
+    _preference_map_points,
     _rainfall_factor,
+    compute_bad_road_penalty_along_route,
+    compute_route_risk,
     flood_risk_at_point,
+    flood_risk_at_points,
+    BAD_ROAD_DECAY_KM,
     SPREAD_FACTOR_KM,
 )
+from backend.models import RoutePath
+
+# Test locations as rows of one (lat, lon) array, named by row index
+POINTS = {"hindmata": 0, "safe": 1, "close": 2}
+_LL = np.array([
+    [19.0056, 72.8417],  # Hindmata pivot (high risk)
+    [18.50, 72.50],  # Far southwest, away from all pivots
+    [19.0156, 72.8417],  # ~1.1 km north of Hindmata
+])
+
+# Combined-risk cases: (point, 24h rain mm, lower, upper) with exclusive bounds
+_RISK_CASES = [
+    ("hindmata", 0.0, 0.08, 0.15),  # dry weather at hotspot, ~0.095
+    ("hindmata", 100.0, 0.9, np.inf),  # heavy rain at hotspot, ~0.95
+    ("safe", 100.0, -np.inf, 0.1),  # far from pivots: stays low even with rain
+]
+_CASE_LL = _LL[[POINTS[name] for name, *_ in _RISK_CASES]]
+_CASE_RAIN, _CASE_LO, _CASE_HI = np.array([case[1:] for case in _RISK_CASES]).T
+
 
+@pytest.fixture(scope="session")
+def pivots():
+    """Pivot (lat, lon, severity) arrays, loaded once for the whole session."""
+    return _load_pivots()
 
-def test_pivots_loaded():
+
+def test_pivots_loaded(pivots):
     """Check that flood pivots are loaded correctly."""
-    pivots = _load_pivots()
-    assert len(pivots) > 0, "❌ No pivots loaded!"
-    assert len(pivots[0]) == 3, "❌ Pivot tuple should have 3 elements!"
-    print(f"✅ Loaded {len(pivots)} flood pivots from CSV")
-    print(f"   Examples: Hindmata {pivots[0]}, Kurla {pivots[3]}")
-    return True
+    lat, lon, sev = pivots
+    assert lat.size > 0, "❌ No pivots loaded!"
+    assert lat.shape == lon.shape == sev.shape, "❌ Pivot lat/lon/severity arrays should align!"
+    print(f"✅ Loaded {lat.size} flood pivots from CSV")
+    print(f"   Examples: {(lat[0], lon[0], sev[0])}, {(lat[3], lon[3], sev[3])}")
+
+
+def _write_csv(path, header, rows, mtime_ns=None):
+    path.write_text(header + "\n" + "".join(row + "\n" for row in rows), encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_point_table_cache(tmp_path, monkeypatch):
+    """Check the .npz cache next to point CSVs is reused only while it matches the CSV."""
+    csv_path = tmp_path / "points.csv"
+    mtime_ns = 1_700_000_000_000_000_000
+    _write_csv(csv_path, "lat,lon,severity", ["19.0,72.8,0.9", "19.1,72.9,0.4"], mtime_ns)
+
+    lat, lon, sev = _load_point_table(csv_path, [])
+    np.testing.assert_array_equal(sev, [0.9, 0.4])
+    assert csv_path.with_suffix(".npz").exists(), "❌ Parsed points should be cached as .npz"
+
+    # Unchanged CSV: served from the cache without parsing
+    with monkeypatch.context() as m:
+        m.setattr(np, "loadtxt", lambda *a, **k: pytest.fail("CSV parsed despite a valid cache"))
+        np.testing.assert_array_equal(_load_point_table(csv_path, [])[0], lat)
+    print("✅ Point cache reused while the CSV is unchanged")
+
+    # Same mtime, different size (e.g. replaced with cp -p)
+    _write_csv(csv_path, "lat,lon,severity", ["19.0,72.8,0.9"], mtime_ns)
+    assert _load_point_table(csv_path, [])[0].size == 1, "❌ Cache should be invalidated by a size change"
+
+    # Same size, older mtime
+    _write_csv(csv_path, "lat,lon,severity", ["19.0,72.8,0.2"], mtime_ns - 10**9)
+    np.testing.assert_array_equal(_load_point_table(csv_path, [])[2], [0.2])
+    print("✅ Point cache invalidated by CSV size and mtime changes")
+
+
+def test_point_table_defaults(tmp_path):
+    """Missing severity column defaults to 0.5; missing CSV uses the fallback."""
+    csv_path = tmp_path / "roads.csv"
+    _write_csv(csv_path, "lat,lon", ["19.0,72.8", "19.1,72.9"])
+    lat, lon, sev = _load_point_table(csv_path, [])
+    np.testing.assert_array_equal(sev, [0.5, 0.5])
+
+    lat, lon, sev = _load_point_table(tmp_path / "missing.csv", [(19.0, 72.8, 0.7)])
+    assert (lat.tolist(), lon.tolist(), sev.tolist()) == ([19.0], [72.8], [0.7])
+    print("✅ Severity defaults to 0.5; missing CSV falls back")
+
+
+def test_point_table_read_only(tmp_path, monkeypatch):
+    """A read-only data directory (e.g. the :ro compose mount) still loads the CSV."""
+    csv_path = tmp_path / "points.csv"
+    _write_csv(csv_path, "lat,lon,severity", ["19.0,72.8,0.9"])
+
+    def read_only(*args, **kwargs):
+        raise OSError(errno.EROFS, "Read-only file system")
+
+    def read_only_open(file, mode="r", *args, **kwargs):
+        if "w" in mode:
+            read_only()
+        return open(file, mode, *args, **kwargs)
+
+    # Linux answers EROFS (not ENOENT) even when unlinking a missing file there
+    monkeypatch.setattr(flood_risk, "open", read_only_open, raising=False)
+    monkeypatch.setattr(Path, "unlink", read_only)
+    lat, lon, sev = _load_point_table(csv_path, [])
+    np.testing.assert_array_equal(sev, [0.9])
+    assert not csv_path.with_suffix(".npz").exists()
+    print("✅ Read-only data directory: CSV parsed without caching")
 
 
 def test_preference_map():
     """Check that preference map works correctly."""
+    pref = _preference_map_points(_LL[:, 0], _LL[:, 1])
+
     # At the Hindmata pivot (high risk)
-    hindmata = (19.0056, 72.8417)
-    pref_at_pivot = _preference_map_at_point(hindmata[0], hindmata[1])
+    pref_at_pivot = pref[POINTS["hindmata"]]
     assert 0.9 < pref_at_pivot <= 1.0, f"❌ Preference at pivot should be ~0.95, got {pref_at_pivot}"
     print(f"✅ Preference map at Hindmata: {pref_at_pivot:.3f} (expect ~0.95)")
 
     # At a safe location (far from all pivots)
-    safe_loc = (18.50, 72.50)  # Far southwest
-    pref_safe = _preference_map_at_point(safe_loc[0], safe_loc[1])
+    pref_safe = pref[POINTS["safe"]]
     assert pref_safe < 0.1, f"❌ Preference at safe location should be ~0, got {pref_safe}"
     print(f"✅ Preference map at safe location (18.50°N, 72.50°E): {pref_safe:.4f} (expect ~0)")
 
     # Test decay with distance
-    close_to_hindmata = (19.0156, 72.8417)  # ~1.1 km away
-    pref_close = _preference_map_at_point(close_to_hindmata[0], close_to_hindmata[1])
+    pref_close = pref[POINTS["close"]]
     assert pref_close < pref_at_pivot, "❌ Preference should decay with distance!"
     print(f"✅ Distance decay working: {pref_at_pivot:.3f} (at pivot) → {pref_close:.3f} (1.1 km away)")
 
-    return True
-
 
 def test_rainfall_factor():
     """Check rainfall modulation curve."""
@@ -69,40 +168,138 @@ def test_rainfall_factor():
     assert 0.95 < factor_heavy <= 1.0, f"❌ Heavy rain factor should be ~1.0, got {factor_heavy}"
     print(f"✅ Rain factor (100mm): {factor_heavy:.3f} (expect ~1.0, full activation)")
 
-    # Verify non-linear (not just linear scaling)
+    # Verify non-linear: 0.1 + 0.9 × x^0.6 is concave, so it rises faster than
+    # the linear ramp at first and lies above it between 0 and 100 mm
     factor_50 = _rainfall_factor(50.0)
     linear_50 = 0.1 + 0.9 * (50 / 100)  # Linear would be here
-    assert factor_50 < linear_50, "❌ Rain factor should be non-linear (sublinear)"
-    print(f"✅ Rain factor (50mm) is non-linear: {factor_50:.3f} < {linear_50:.3f} (linear)")
-
-    return True
+    assert factor_50 > linear_50, "❌ Rain factor should be non-linear (concave, above linear)"
+    print(f"✅ Rain factor (50mm) is non-linear: {factor_50:.3f} > {linear_50:.3f} (linear)")
 
 
 def test_combined_risk():
     """Check final combined risk computation."""
-    hindmata = (19.0056, 72.8417)
-
-    # Dry weather at hotspot
-    risk_dry = flood_risk_at_point(hindmata[0], hindmata[1], 0.0)
-    assert 0.08 < risk_dry < 0.15, f"❌ Dry risk at Hindmata should be ~0.095, got {risk_dry}"
-    print(f"✅ Risk at Hindmata (dry): {risk_dry:.3f}")
-
-    # Heavy rain at hotspot
-    risk_wet = flood_risk_at_point(hindmata[0], hindmata[1], 100.0)
-    assert risk_wet > 0.9, f"❌ Wet risk at Hindmata should be ~0.95, got {risk_wet}"
-    print(f"✅ Risk at Hindmata (100mm rain): {risk_wet:.3f}")
-
-    # Verify rain increases risk
-    assert risk_wet > risk_dry, "❌ Rain should increase risk!"
-    print(f"✅ Risk amplification: {risk_dry:.3f} (dry) → {risk_wet:.3f} (rain)")
-
-    # Safe location (low risk even with rain)
-    safe_loc = (18.50, 72.50)
-    risk_safe_wet = flood_risk_at_point(safe_loc[0], safe_loc[1], 100.0)
-    assert risk_safe_wet < 0.1, f"❌ Risk at safe location even with rain should be low, got {risk_safe_wet}"
-    print(f"✅ Risk at safe location (100mm rain): {risk_safe_wet:.4f} (stays low)")
-
-    return True
+    actual = flood_risk_at_points(_CASE_LL[:, 0], _CASE_LL[:, 1], _CASE_RAIN)
+    in_bounds = (_CASE_LO < actual) & (actual < _CASE_HI)
+    assert in_bounds.all(), "❌ Risk out of bounds: " + ", ".join(
+        f"{name} @ {rain}mm = {risk:.3f}"
+        for (name, rain, *_), risk, ok in zip(_RISK_CASES, actual, in_bounds) if not ok
+    )
+    for (name, rain, *_), risk in zip(_RISK_CASES, actual):
+        print(f"✅ Risk at {name} ({rain:.0f}mm rain): {risk:.3f}")
+
+    # The scalar entry point the app uses must agree with the batched one
+    scalar = [flood_risk_at_point(lat, lon, rain) for (lat, lon), rain in zip(_CASE_LL, _CASE_RAIN)]
+    np.testing.assert_allclose(scalar, actual, atol=1e-6, err_msg="❌ Scalar and batched risk differ")
+    print("✅ flood_risk_at_point agrees with flood_risk_at_points")
+
+    # Verify rain increases risk (first two cases: Hindmata dry vs. wet)
+    assert actual[1] > actual[0], "❌ Rain should increase risk!"
+    print(f"✅ Risk amplification: {actual[0]:.3f} (dry) → {actual[1]:.3f} (rain)")
+
+
+def test_risk_input_shapes():
+    """Batched risk accepts scalars and 2-D arrays on both the NumPy and kernel paths."""
+    lat, lon = _LL[POINTS["hindmata"]]
+    expected = flood_risk_at_point(lat, lon, 50.0)
+
+    scalar = flood_risk_at_points(lat, lon, 50.0)
+    assert np.shape(scalar) == () and abs(float(scalar) - expected) < 1e-6
+
+    # small batch (NumPy broadcast) and large batch (compiled kernel when available)
+    for shape in [(2, 2), (40, 30)]:
+        risks = flood_risk_at_points(np.full(shape, lat), np.full(shape, lon), 50.0)
+        assert risks.shape == shape, f"❌ Expected shape {shape}, got {risks.shape}"
+        np.testing.assert_allclose(risks, expected, atol=1e-6)
+    print("✅ flood_risk_at_points keeps scalar and 2-D input shapes")
+
+
+def _dist_km(a, b):
+    """Brute-force equirectangular distances between (lat, lon) rows of a and b."""
+    dx = (b[None, :, 1] - a[:, None, 1]) * COS_LAT0 * KM_PER_DEG
+    dy = (b[None, :, 0] - a[:, None, 0]) * KM_PER_DEG
+    return np.sqrt(dx * dx + dy * dy)
+
+
+def _route_risk_reference(route_ll, grid, pivots):
+    """Plain NumPy route risk: nearest-grid rain × exact preference, averaged."""
+    lat, lon, sev = pivots
+    pref = (sev * np.exp(-_dist_km(route_ll, np.column_stack([lat, lon])) / SPREAD_FACTOR_KM)).max(axis=1)
+    rain = grid[_dist_km(route_ll, grid[:, :2]).argmin(axis=1), 2] if len(grid) else np.zeros(len(route_ll))
+    factor = 0.1 + 0.9 * np.minimum(rain / 100.0, 1.0) ** 0.6
+    return float((np.minimum(pref, 1.0) * factor).mean())
+
+
+def test_route_risk(pivots):
+    """Check the fused route-risk kernel against a plain NumPy reference."""
+    rng = np.random.default_rng(7)
+    route_ll = np.column_stack([
+        19.00 + np.cumsum(rng.uniform(0, 0.002, 100)),
+        72.83 + np.cumsum(rng.uniform(-0.001, 0.002, 100)),
+    ])
+    grid = np.column_stack([
+        19.076 + rng.uniform(-0.15, 0.15, 9),
+        72.877 + rng.uniform(-0.15, 0.15, 9),
+        rng.uniform(2.0, 120.0, 9),
+    ])
+    path = RoutePath.from_latlng(route_ll)
+
+    for rainfall_grid in (grid.tolist(), []):
+        risk = compute_route_risk(path, rainfall_grid)
+        expected = _route_risk_reference(route_ll, np.array(rainfall_grid).reshape(-1, 3), pivots)
+        # rain factor comes from a lookup table (< 2e-4 off above 1 mm)
+        assert abs(risk - expected) < 1e-3, f"❌ Route risk {risk} differs from reference {expected}"
+        print(f"✅ Route risk ({len(rainfall_grid)} rain cells): {risk:.4f} (reference {expected:.4f})")
+
+    assert compute_route_risk(path[:0], grid.tolist()) == 0.0, "❌ Empty route should have zero risk"
+
+
+def _bad_road_reference(points_ll, lat, lon, sev, cutoff_km=np.inf):
+    """Brute-force max of severity × exp(-d) over bad roads within the cutoff (0 if none)."""
+    d = _dist_km(points_ll, np.column_stack([lat, lon]))
+    contrib = np.where(d <= cutoff_km, sev * np.exp(-d / BAD_ROAD_DECAY_KM), 0.0)
+    return np.minimum(contrib.max(axis=1), 1.0)
+
+
+def test_bad_road_penalty():
+    """Check the bad-road penalty on the default (broadcast) path."""
+    assert flood_risk._BAD_SEV.size <= flood_risk._BAD_ROAD_BROADCAST_MAX
+    rng = np.random.default_rng(11)
+    route_ll = np.column_stack([rng.uniform(19.00, 19.10, 50), rng.uniform(72.82, 72.92, 50)])
+
+    penalty = compute_bad_road_penalty_along_route(RoutePath.from_latlng(route_ll))
+    expected = _bad_road_reference(
+        route_ll, flood_risk._BAD_LAT, flood_risk._BAD_LON, flood_risk._BAD_SEV,
+    ).mean()
+    assert abs(penalty - expected) < 1e-12, f"❌ Bad-road penalty {penalty} differs from reference {expected}"
+    print(f"✅ Bad-road penalty along route: {penalty:.4f} (reference {expected:.4f})")
+
+    empty = RoutePath.from_latlng(np.empty((0, 2)))
+    assert compute_bad_road_penalty_along_route(empty) == 0.0, "❌ Empty route should have no penalty"
+
+
+def test_bad_road_tree(monkeypatch):
+    """Check the KD-tree path (many bad roads) against a brute-force reference."""
+    cKDTree = pytest.importorskip("scipy.spatial").cKDTree
+    rng = np.random.default_rng(5)
+    n_roads = 2 * flood_risk._BAD_ROAD_BROADCAST_MAX + 1
+    lat = rng.uniform(18.95, 19.20, n_roads)
+    lon = rng.uniform(72.80, 73.00, n_roads)
+    sev = rng.uniform(0.2, 1.0, n_roads)
+    x, y = flood_risk._offsets_km(lat, lon)
+    for name, value in [
+        ("_BAD_LAT", lat), ("_BAD_LON", lon), ("_BAD_SEV", sev), ("_BAD_X", x), ("_BAD_Y", y),
+        ("_BAD_TREE", cKDTree(np.column_stack([x, y]))),
+    ]:
+        monkeypatch.setattr(flood_risk, name, value)
+
+    points_ll = np.column_stack([rng.uniform(18.90, 19.25, 300), rng.uniform(72.75, 73.05, 300)])
+    points_ll[:5] = [18.50, 72.50]  # far from every bad road: no neighbours in the cutoff
+    penalty = flood_risk._road_condition_points(points_ll[:, 0], points_ll[:, 1])
+    expected = _bad_road_reference(points_ll, lat, lon, sev, flood_risk._BAD_ROAD_CUTOFF_KM)
+    np.testing.assert_allclose(penalty, expected, rtol=0, atol=1e-12, err_msg="❌ KD-tree bad-road penalty differs")
+    # empty neighbour groups both lead and interleave with hits in the reduceat
+    assert (penalty[:5] == 0.0).all() and (penalty[5:] == 0.0).any() and (penalty > 0.0).any()
+    print(f"✅ KD-tree bad-road penalty matches brute force over {n_roads} roads")
 
 
 def test_constants():
@@ -112,51 +309,7 @@ def test_constants():
     print(f"   (Lower → faster decay, Higher → slower decay)")
     assert 0.5 < SPREAD_FACTOR_KM < 5.0, "❌ Spread factor should be between 0.5 and 5 km"
     print(f"✅ Spread factor in reasonable range")
-    return True
-
-
-def run_all_tests():
-    """Run all validation tests."""
-    print("=" * 60)
-    print("🧪 OptiRoute Two-Layer System Validation")
-    print("=" * 60)
-
-    tests = [
-        ("Pivots Loading", test_pivots_loaded),
-        ("Preference Map", test_preference_map),
-        ("Rainfall Factor", test_rainfall_factor),
-        ("Combined Risk", test_combined_risk),
-        ("Constants", test_constants),
-    ]
-
-    passed = 0
-    failed = 0
-
-    for name, test_func in tests:
-        print(f"\n📝 Testing: {name}")
-        print("-" * 60)
-        try:
-            if test_func():
-                passed += 1
-        except AssertionError as e:
-            print(f"❌ Test failed: {e}")
-            failed += 1
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            failed += 1
-
-    print("\n" + "=" * 60)
-    print(f"📊 Results: {passed} passed, {failed} failed")
-    print("=" * 60)
-
-    if failed == 0:
-        print("\n✅ ALL TESTS PASSED! System is ready to use.")
-        return True
-    else:
-        print(f"\n❌ {failed} test(s) failed. Please review the errors above.")
-        return False
 
 
 if __name__ == "__main__":
-    success = run_all_tests()
-    sys.exit(0 if success else 1)
+    sys.exit(pytest.main([__file__]))